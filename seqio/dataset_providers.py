@@ -918,25 +918,13 @@ class Task(DatasetProviderBase):
     self._predict_with_aux_metric_fns = []
     self._score_metric_fns = []
     for metric_fn in metric_fns:
-      pos_args = tuple(
-          key
-          for key, param in inspect.signature(metric_fn).parameters.items()
-          if param.default == inspect.Parameter.empty
-          and param.kind == inspect.Parameter.POSITIONAL_OR_KEYWORD
-      )
-      if pos_args == ("targets", "scores"):
+      model_output_type = metrics_lib.get_model_output_type(metric_fn)
+      if model_output_type == metrics_lib.ModelOutputType.SCORE:
         self._score_metric_fns.append(metric_fn)
-      elif pos_args == ("targets", "predictions"):
+      elif model_output_type == metrics_lib.ModelOutputType.PREDICTION:
         self._predict_metric_fns.append(metric_fn)
-      elif pos_args == ("targets", "predictions", "aux_values"):
+      elif model_output_type == metrics_lib.ModelOutputType.PREDICTION_WITH_AUX:
         self._predict_with_aux_metric_fns.append(metric_fn)
-      else:
-        raise ValueError(
-            "Metric functions must have positional arguments matching either "
-            "('targets', 'scores'), ('targets', 'predictions') or "
-            "('targets', 'predictions', 'aux_values'). "
-            f"Got: {pos_args}"
-        )
 
     self._name = name
     self._source = source
@@ -15,6 +15,7 @@
 """Tests for seqio.dataset_providers."""
 
 import copy
+import dataclasses
 import functools
 import os
 import shutil
@@ -242,6 +243,28 @@ class TasksTest(test_utils.FakeTaskTest):
 
     # pylint:enable=unused-argument
 
+  def test_unhashable_metric_fn(self):
+    @dataclasses.dataclass
+    class PredictMetric:
+      scale: float = 1.0
+
+      def __call__(self, targets, predictions):
+        del targets, predictions
+        return {}
+
+    metric_fn = PredictMetric()
+    task = self.add_task(
+        "unhashable_metric",
+        source=self.function_source,
+        metric_fns=[metric_fn],
+    )
+
+    self.assertEqual([metric_fn], task.predict_metric_fns)
+    self.assertEqual(
+        metrics_lib.ModelOutputType.PREDICTION,
+        task.metric_objs[0].model_output_type,
+    )
+
   def test_no_tfds_version(self):
     with self.assertRaisesWithLiteralMatch(
         ValueError, "TFDS name must contain a version number, got: fake"
@@ -370,6 +370,7 @@ class Evaluator:
     )
     self._metrics_future = None
     self._target_field_name = target_field_name
+    self._loggers = ()
 
     if not self._eval_tasks:
       logging.warning(
@@ -523,11 +524,18 @@ class Evaluator:
     """Wait for metrics to be written before deletion."""
     if self._metrics_executor:
       self._metrics_executor.shutdown(wait=True)
+    self._close_loggers()
 
   def close(self):
     """Wait for metrics to be written."""
     if self._metrics_executor:
       self._metrics_executor.shutdown(wait=True)
+    self._close_loggers()
+
+  def _close_loggers(self):
+    """Waits for pending logging to complete."""
+    for logger in self._loggers:
+      logger.close()
 
   def evaluate(
       self,
@@ -1330,6 +1330,24 @@ class EvaluationTest(tf.test.TestCase):
       for metric_obj in task.metric_objs:
         metric_obj.from_model_output(inputs, dummy_outputs, dummy_features)
 
+  def test_legacy_metric_overridden_postprocess_fn(self):
+    class UpperCaseTargetsMetric(metrics_lib.LegacyMetric):
+
+      def postprocess_fn(self, targets_or_predictions, **postprocess_kwargs):
+        return targets_or_predictions.upper()
+
+    metric_obj = UpperCaseTargetsMetric.empty(_sum_scores_metric, None)
+    dummy_features = {
+        "targets": utils.Feature(
+            vocabulary=vocabularies.PassThroughVocabulary(size=4)
+        )
+    }
+    metric_obj = metric_obj.from_model_output(
+        [{"targets_pretokenized": b"foo"}], np.array([1.0]), dummy_features
+    )
+
+    self.assertEqual(["FOO"], metric_obj.targets_and_inferences["targets"])
+
 
 if __name__ == "__main__":
   tf.test.main()
@@ -16,12 +16,14 @@
 
 import abc
 import base64
+import concurrent.futures
 import dataclasses
+import functools
 import itertools
 import json
 import os
 import time
-from typing import Any, Mapping, Optional, Sequence, Type, Dict, Tuple
+from typing import Any, Mapping, Optional, Sequence, Type, Dict, List, Tuple
 
 from absl import logging
 import numpy as np
@@ -29,6 +31,11 @@ from seqio import metrics as metrics_lib
 import tensorflow as tf
 import tensorflow_datasets as tfds
 
+_BFLOAT16 = np.dtype(tf.bfloat16.as_numpy_dtype)
+
+# Approximate number of characters to buffer before writing to a file.
+_WRITE_BUFFER_SIZE = 1 << 20
+
 
 def skip_none_value_dict_factory(
     data: Sequence[Tuple[str, Any]]
@@ -73,6 +80,9 @@ class Logger(abc.ABC):
     """
     ...
 
+  def close(self) -> None:
+    """Waits for any pending logging to complete."""
+
 
 class PyLoggingLogger(Logger):
   """A logger that writes metrics using the standard Python log."""
@@ -289,20 +299,22 @@ class TensorBoardLoggerV1(Logger):
 
     summary_writer = self._get_summary_writer(task_name)
 
+    # All metrics are written as a single summary event.
+    summary = tf.compat.v1.Summary()
     for metric_name, metric_value in metrics.items():
       if not isinstance(metric_value, metrics_lib.Scalar):
         raise ValueError(
             f"Value for metric '{metric_name}' should be of "
             f"type 'Scalar, got '{type(metric_value).__name__}'."
         )
-      summary = tf.compat.v1.Summary()
 
       tag = f"eval/{metric_name}"
       logging.info("%s at step %d: %.3f", tag, step, metric_value.value)
 
       summary.value.add(tag=tag, simple_value=metric_value.value)
-      summary_writer.add_summary(summary, step)
 
+    if summary.value:
+      summary_writer.add_summary(summary, step)
     summary_writer.flush()
 
 
@@ -322,16 +334,22 @@ class TensorAndNumpyEncoder(json.JSONEncoder):
 
     if isinstance(obj, np.ndarray):
       obj_dtype = obj.dtype
-      if str(obj.dtype) == "bfloat16":
-        # bfloat16 not supported, convert to float32.
-        obj = obj.astype(np.float32)
+      is_bfloat16 = obj.dtype == _BFLOAT16
       if obj.size <= self.max_ndarray_size:
+        if is_bfloat16:
+          # bfloat16 not supported, convert to float32.
+          obj = obj.astype(np.float32)
         return obj.tolist()  # Convert arrays to lists of py-native types.
       else:
         # If the ndarray is larger than allowed, return a summary string
-        # instead of the entire array.
-        first_five_str = str(obj.reshape([-1])[:5].tolist())[1:-1]
-        last_five_str = str(obj.reshape([-1])[-5:].tolist())[1:-1]
+        # instead of the entire array. Only the summarized elements are cast.
+        flat_obj = obj.reshape([-1])
+        first_five, last_five = flat_obj[:5], flat_obj[-5:]
+        if is_bfloat16:
+          first_five = first_five.astype(np.float32)
+          last_five = last_five.astype(np.float32)
+        first_five_str = str(first_five.tolist())[1:-1]
+        last_five_str = str(last_five.tolist())[1:-1]
         return (
             f"{type(obj).__name__}(shape={obj.shape}, dtype={obj_dtype}); "
             f"summary: {first_five_str} ... {last_five_str}"
@@ -340,15 +358,17 @@ class TensorAndNumpyEncoder(json.JSONEncoder):
         type(obj), np.bool_
     ):
       return obj.item()  # Convert most primitive np types to py-native types.
-    elif hasattr(obj, "dtype") and obj.dtype == tf.bfloat16.as_numpy_dtype:
+    elif hasattr(obj, "dtype") and obj.dtype == _BFLOAT16:
       return float(obj)
     elif isinstance(obj, bytes):
       # JSON doesn't support bytes. First, try to decode using utf-8 in case
       # it's text. Otherwise, just base64 encode the bytes.
+      if obj.isascii():
+        return obj.decode("ascii")
       try:
         return obj.decode("utf-8")
       except UnicodeDecodeError:
-        return base64.b64encode(obj)
+        return base64.b64encode(obj).decode("ascii")
 
     if dataclasses.is_dataclass(obj):
       return dataclasses.asdict(obj, dict_factory=skip_none_value_dict_factory)
@@ -357,54 +377,73 @@ class TensorAndNumpyEncoder(json.JSONEncoder):
 
 
 def _check_json_serializable(
-    field_name: str, value: Any, json_encoder_cls: Type[json.JSONEncoder]
+    field_name: str, value: Any, json_encoder: json.JSONEncoder
 ) -> bool:
   try:
-    json.dumps(value, cls=json_encoder_cls)
+    json_encoder.encode(value)
     return True
   except TypeError:
     logging.warning("`%s` is not JSON serializable", field_name, exc_info=True)
     return False
 
 
-class JSONLogger(Logger):
-  """A logger that writes metrics and model outputs to JSONL files."""
+class _JSONLogWriter:
+  """Writes metrics and model outputs to JSONL files for a JSONLogger."""
 
   def __init__(
       self,
       output_dir: str,
-      write_n_results: Optional[int] = None,
-      json_encoder_cls: Type[json.JSONEncoder] = TensorAndNumpyEncoder,
+      write_n_results: Optional[int],
+      json_encoder_cls: Type[json.JSONEncoder],
   ):
-    """JSONLogger constructor.
-
-    Args:
-      output_dir: The base directory where all logs will be written.
-      write_n_results: number of scores/predictions to be written to the file at
-        each step. If None, scores and predictions from all examples are
-        written.
-      json_encoder_cls: Class to use for serializing JSON to file.
-    """
-    super().__init__(output_dir)
+    self.output_dir = output_dir
     self._write_n_results = write_n_results
-    self._json_encoder_cls = json_encoder_cls
+    # A single encoder instance is reused rather than letting `json.dumps`
+    # construct a new one for every example. Non-ASCII characters are written
+    # as is and whitespace is omitted to keep the files small.
+    self._json_encoder = json_encoder_cls(
+        ensure_ascii=False, separators=(",", ":")
+    )
+    # Contents of metrics files living on filesystems that do not support
+    # mode="a", keyed by filename.
+    self._metrics_cache: Dict[str, str] = {}
 
-  def __call__(
+  def append_metrics_line(self, metrics_fname: str, line: str) -> None:
+    """Appends a single line to the metrics file."""
+    if metrics_fname not in self._metrics_cache:
+      try:
+        with tf.io.gfile.GFile(metrics_fname, "a") as f:
+          f.write(line)
+        return
+      except tf.errors.UnimplementedError:
+        logging.info(
+            "Filesystem does not support appending to %s, falling back to "
+            "rewriting the file.",
+            metrics_fname,
+        )
+        file_contents = ""
+        if tf.io.gfile.exists(metrics_fname):
+          with tf.io.gfile.GFile(metrics_fname, "r") as f:
+            file_contents = f.read()
+        self._metrics_cache[metrics_fname] = file_contents
+
+    # We simulate an atomic append for filesystems that do not suppport
+    # mode="a". The file contents are cached so they are only read once.
+    self._metrics_cache[metrics_fname] += line
+    with tf.io.gfile.GFile(metrics_fname + ".tmp", "w") as f:
+      f.write(self._metrics_cache[metrics_fname])
+    tf.io.gfile.rename(metrics_fname + ".tmp", metrics_fname, overwrite=True)
+
+  def write(
       self,
       task_name: str,
-      step: Optional[int],
+      step: int,
       metrics: Mapping[str, metrics_lib.MetricValue],
       dataset: Optional[tf.data.Dataset],
       inferences: Optional[Mapping[str, Sequence[Any]]],
       targets: Optional[Sequence[Any]],
   ) -> None:
-    if step is None:
-      logging.warning(
-          "Step number for the logging session is not provided. "
-          "A dummy value of -1 will be used."
-      )
-      step = -1
-
+    """Writes the metrics and inferences to JSONL files."""
     metrics_fname = os.path.join(self.output_dir, f"{task_name}-metrics.jsonl")
 
     serializable_metrics = {}
@@ -424,22 +463,11 @@ class JSONLogger(Logger):
 
     if metrics:
       logging.info("Appending metrics to %s", metrics_fname)
-      # We simulate an atomic append for filesystems that do not suppport
-      # mode="a".
-      file_contents = ""
-      if tf.io.gfile.exists(metrics_fname):
-        with tf.io.gfile.GFile(metrics_fname, "r") as f:
-          file_contents = f.read()
-      with tf.io.gfile.GFile(metrics_fname + ".tmp", "w") as f:
-        f.write(file_contents)
-        f.write(
-            json.dumps(
-                {"step": step, **serializable_metrics},
-                cls=self._json_encoder_cls,
-            )
-        )
-        f.write("\n")
-      tf.io.gfile.rename(metrics_fname + ".tmp", metrics_fname, overwrite=True)
+      self.append_metrics_line(
+          metrics_fname,
+          self._json_encoder.encode({"step": step, **serializable_metrics})
+          + "\n",
+      )
 
     if self._write_n_results == 0:
       return
@@ -460,45 +488,180 @@ class JSONLogger(Logger):
       inference_types = list(inferences.keys())
 
       # The auxiliary values have a different shape than the others to conserve
-      # memory. They are handled separately below.
+      # memory: they map each aux value name to values aligned with the dataset.
       all_aux_values = {}
       if "aux_value" in inference_types:
         inference_types.remove("aux_value")
         all_aux_values = inferences["aux_value"]
-      to_zip = [tfds.as_numpy(dataset), targets] + [
-          inferences.get(t) for t in inference_types
-      ]
-      examples_with_results = itertools.zip_longest(*to_zip)
+      aux_value_names = list(all_aux_values)
+
+      result_sources = (
+          [targets]
+          + [inferences[t] for t in inference_types]
+          + [all_aux_values[name] for name in aux_value_names]
+      )
       if self._write_n_results:
-        examples_with_results = itertools.islice(
-            examples_with_results, 0, self._write_n_results
-        )
-      field_names = ["target"] + inference_types
+        # Truncates the dataset and results before iterating over them so that
+        # no work is done for examples that are not written.
+        dataset = dataset.take(self._write_n_results)
+        result_sources = [
+            source[: self._write_n_results] for source in result_sources
+        ]
+      # Every source is consumed lazily so that examples can be released as
+      # soon as they are written.
+      examples_with_results = itertools.zip_longest(
+          tfds.as_numpy(dataset), *result_sources
+      )
+      field_names = (
+          ["target"]
+          + inference_types
+          + [f"aux_{name}" for name in aux_value_names]
+      )
 
-      for example_index, (inp, *results) in enumerate(examples_with_results):
-        # tfds.as_numpy does not convert ragged tensors
-        for k in inp:
+      # Lines are written in chunks to avoid a write call (and an RPC on
+      # remote filesystems) per example.
+      buffered_lines = []
+      buffered_size = 0
+      num_written = 0
+      # tfds.as_numpy does not convert ragged tensors, so they are converted
+      # below. The ragged features are found once from the dataset spec.
+      ragged_keys = tuple(
+          k
+          for k, spec in dataset.element_spec.items()
+          if isinstance(spec, tf.RaggedTensorSpec)
+      )
+      for inp, *results in examples_with_results:
+        for k in ragged_keys:
           if isinstance(inp[k], tf.RaggedTensor):
             inp[k] = inp[k].numpy()
 
         json_dict = {"input": inp}
-
-        for field_name, res in zip(field_names, results):
-          if _check_json_serializable(field_name, res, self._json_encoder_cls):
-            json_dict[field_name] = res
-
-        for aux_value_name in all_aux_values:
-          aux_value = inferences["aux_value"][aux_value_name][example_index]
-          if _check_json_serializable(
-              aux_value_name, aux_value, self._json_encoder_cls
-          ):
-            json_dict[f"aux_{aux_value_name}"] = aux_value
-
-        json_str = json.dumps(json_dict, cls=self._json_encoder_cls)
-        f.write(json_str + "\n")
+        json_dict.update(zip(field_names, results))
+
+        try:
+          json_str = self._json_encoder.encode(json_dict)
+        except TypeError:
+          # Some fields are not serializable. Check each of them separately
+          # and drop the ones that fail.
+          json_dict = {"input": inp}
+          for field_name, res in zip(field_names, results):
+            if _check_json_serializable(field_name, res, self._json_encoder):
+              json_dict[field_name] = res
+
+          json_str = self._json_encoder.encode(json_dict)
+        buffered_lines.append(json_str + "\n")
+        num_written += 1
+        buffered_size += len(json_str) + 1
+        if buffered_size >= _WRITE_BUFFER_SIZE:
+          f.write("".join(buffered_lines))
+          buffered_lines = []
+          buffered_size = 0
+      f.write("".join(buffered_lines))
     write_time = time.time() - write_tick
     logging.info(
         "Writing completed in %02f seconds (%02f examples/sec).",
         write_time,
-        len(inferences) / write_time,
+        num_written / write_time,
+    )
+
+
+class JSONLogger(Logger):
+  """A logger that writes metrics and model outputs to JSONL files."""
+
+  def __init__(
+      self,
+      output_dir: str,
+      write_n_results: Optional[int] = None,
+      json_encoder_cls: Type[json.JSONEncoder] = TensorAndNumpyEncoder,
+      write_async: bool = False,
+  ):
+    """JSONLogger constructor.
+
+    Args:
+      output_dir: The base directory where all logs will be written.
+      write_n_results: number of scores/predictions to be written to the file at
+        each step. If None, scores and predictions from all examples are
+        written.
+      json_encoder_cls: Class to use for serializing JSON to file.
+      write_async: If True, files are written in a background thread and the
+        call returns immediately. The next call waits for the previous write to
+        complete. Call `close` to wait for the last write.
+    """
+    super().__init__(output_dir)
+    self._executor = None
+    if write_async:
+      self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    self._pending_writes: List[concurrent.futures.Future] = []
+    # The background writes only reference the writer, not the logger, so that
+    # the logger can be deleted while a write is pending.
+    self._writer = _JSONLogWriter(output_dir, write_n_results, json_encoder_cls)
+
+  def _wait_for_pending_writes(self) -> None:
+    """Waits for background writes, re-raising any exception they raised."""
+    pending_writes, self._pending_writes = self._pending_writes, []
+    for future in pending_writes:
+      future.result()
+
+  def __del__(self):
+    """Stops the background writer without waiting or raising on deletion."""
+    # Pending writes still complete, but errors are only surfaced by `close`.
+    if self._executor:
+      self._executor.shutdown(wait=False)
+
+  def close(self) -> None:
+    """Waits for pending writes and stops the background writer, if any."""
+    try:
+      self._wait_for_pending_writes()
+    finally:
+      if self._executor:
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+  def __call__(
+      self,
+      task_name: str,
+      step: Optional[int],
+      metrics: Mapping[str, metrics_lib.MetricValue],
+      dataset: Optional[tf.data.Dataset],
+      inferences: Optional[Mapping[str, Sequence[Any]]],
+      targets: Optional[Sequence[Any]],
+  ) -> None:
+    if step is None:
+      logging.warning(
+          "Step number for the logging session is not provided. "
+          "A dummy value of -1 will be used."
+      )
+      step = -1
+
+    if not self._executor:
+      self._writer.write(task_name, step, metrics, dataset, inferences, targets)
+      return
+
+    self._wait_for_pending_writes()
+    # The containers are copied so that the caller may reuse them while the
+    # background write is in progress.
+    write_fn = functools.partial(
+        self._writer.write,
+        task_name,
+        step,
+        dict(metrics),
+        dataset,
+        dict(inferences) if inferences else inferences,
+        list(targets) if targets else targets,
     )
+
+    def wrap_graph(fn):
+      # The dataset ops must be created in the caller's graph.
+      graph = tf.compat.v1.get_default_graph()
+
+      def wrapped_fn():
+        with graph.as_default():
+          return fn()
+
+      return wrapped_fn
+
+    if not tf.executing_eagerly():
+      write_fn = wrap_graph(write_fn)
+
+    self._pending_writes.append(self._executor.submit(write_fn))
+
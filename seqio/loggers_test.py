@@ -17,9 +17,13 @@
 
 
 import dataclasses
+import gc
 import json
 import os
+import threading
 from typing import Optional
+from unittest import mock
+import weakref
 
 import numpy as np
 from seqio import loggers
@@ -58,22 +62,38 @@ class TensorBoardLoggerTestV1(tf.test.TestCase):
     serialized_events = list(
         tfds.as_numpy(tf.data.TFRecordDataset(event_file))
     )[1:]
-    event1 = tf.compat.v1.Event.FromString(serialized_events[0]).summary.value[
-        0
-    ]
-    rouge1 = event1.simple_value
-    tag_rouge1 = event1.tag
-    event2 = tf.compat.v1.Event.FromString(serialized_events[1]).summary.value[
-        0
-    ]
-    rouge2 = event2.simple_value
-    tag_rouge2 = event2.tag
+    # All metrics are written in a single event.
+    self.assertLen(serialized_events, 1)
+    summary = tf.compat.v1.Event.FromString(serialized_events[0]).summary
+    rouge1 = summary.value[0].simple_value
+    tag_rouge1 = summary.value[0].tag
+    rouge2 = summary.value[1].simple_value
+    tag_rouge2 = summary.value[1].tag
 
     self.assertEqual(tag_rouge1, "eval/rouge1")
     self.assertEqual(tag_rouge2, "eval/rouge2")
     self.assertAlmostEqual(rouge1, 50, places=4)
     self.assertAlmostEqual(rouge2, 100, places=4)
 
+  def test_logging_no_metrics(self):
+    self.logger(
+        task_name="log_eval_task",
+        step=1,
+        metrics={},
+        dataset=tf.data.Dataset.range(0),
+        inferences={},
+        targets=[],
+    )
+    task_output_dir = os.path.join(self.logger.output_dir, "log_eval_task")
+    event_file = os.path.join(
+        task_output_dir, tf.io.gfile.listdir(task_output_dir)[0]
+    )
+    # Only the boilerplate event is written.
+    serialized_events = list(
+        tfds.as_numpy(tf.data.TFRecordDataset(event_file))
+    )
+    self.assertLen(serialized_events, 1)
+
 
 class TensorBoardLoggerTest(tf.test.TestCase):
 
@@ -589,6 +609,33 @@ class JSONLoggerTest(tf.test.TestCase):
     ]
     self.assertEqual(actual, expected)
 
+  def test_compact_non_ascii_output(self):
+    inferences = {"prediction": ["prédiction0", "prédiction1"]}
+    targets = ["target0", "target1"]
+    tmp_dir = self.create_tempdir().full_path
+    task_dataset = self._get_task_dataset_for_write_to_file_tests()
+
+    logger = loggers.JSONLogger(tmp_dir, write_n_results=1)
+    logger(
+        task_name="test",
+        step=42,
+        metrics={"accuracy": metrics_lib.Scalar(100)},
+        dataset=task_dataset,
+        inferences=inferences,
+        targets=targets,
+    )
+
+    with open(os.path.join(tmp_dir, "test-metrics.jsonl")) as f:
+      self.assertEqual(f.read(), '{"step":42,"accuracy":100}\n')
+
+    inferences_fname = os.path.join(tmp_dir, "test-000042.jsonl")
+    with open(inferences_fname, encoding="utf-8") as f:
+      self.assertEqual(
+          f.read(),
+          '{"input":{"inputs_pretokenized":"i0","targets_pretokenized":"t0"},'
+          '"target":"target0","prediction":"prédiction0"}\n',
+      )
+
   def test_2d_ragged_input(self):
     x = [
         {
@@ -681,6 +728,48 @@ class JSONLoggerTest(tf.test.TestCase):
 
     self.assertEqual(actual, expected)
 
+  def test_metrics_append_unsupported(self):
+    tmp_dir = self.create_tempdir().full_path
+    metrics_fname = os.path.join(tmp_dir, "test-metrics.jsonl")
+    with open(metrics_fname, "w") as f:
+      f.write('{"step": 1, "accuracy": 10}\n')
+
+    gfile_cls = tf.io.gfile.GFile
+    opened_files = []
+
+    def gfile_without_append(name, mode="r"):
+      opened_files.append((name, mode))
+      if mode == "a":
+        raise tf.errors.UnimplementedError(None, None, "append unsupported")
+      return gfile_cls(name, mode)
+
+    logger = loggers.JSONLogger(tmp_dir, write_n_results=0)
+    with mock.patch.object(
+        tf.io.gfile, "GFile", side_effect=gfile_without_append
+    ):
+      for step, accuracy in ((42, 100), (48, 50)):
+        logger(
+            task_name="test",
+            step=step,
+            metrics={"accuracy": metrics_lib.Scalar(accuracy)},
+            dataset=tf.data.Dataset.range(0),
+            inferences={},
+            targets=[],
+        )
+
+    # Read the written jsonl file.
+    with open(metrics_fname) as f:
+      actual = [json.loads(line.strip()) for line in f]
+
+    expected = [
+        {"step": 1, "accuracy": 10},
+        {"step": 42, "accuracy": 100},
+        {"step": 48, "accuracy": 50},
+    ]
+    self.assertEqual(actual, expected)
+    # The existing file is only read once.
+    self.assertEqual(opened_files.count((metrics_fname, "r")), 1)
+
   def test_metrics_non_serializable(self):
     tmp_dir = self.create_tempdir().full_path
 
@@ -738,6 +827,109 @@ class JSONLoggerTest(tf.test.TestCase):
         tf.io.gfile.exists(os.path.join(tmp_dir, "test-000042.jsonl"))
     )
 
+  def test_write_async(self):
+    inferences = {"prediction": ["pred0", "pred1"], "score": [0.2, 0.3]}
+    targets = ["target0", "target1"]
+    tmp_dir = self.create_tempdir().full_path
+    task_dataset = self._get_task_dataset_for_write_to_file_tests()
+
+    logger = loggers.JSONLogger(tmp_dir, write_async=True)
+    for step in (42, 48):
+      logger(
+          task_name="test",
+          step=step,
+          metrics={"accuracy": metrics_lib.Scalar(step)},
+          dataset=task_dataset,
+          inferences=inferences,
+          targets=targets,
+      )
+    logger.close()
+
+    # Validate the metrics file.
+    with open(os.path.join(tmp_dir, "test-metrics.jsonl")) as f:
+      actual = [json.loads(line.strip()) for line in f]
+    self.assertEqual(
+        actual, [{"step": 42, "accuracy": 42}, {"step": 48, "accuracy": 48}]
+    )
+
+    # Read the written jsonl files.
+    for step in (42, 48):
+      with open(os.path.join(tmp_dir, f"test-{step:06}.jsonl")) as f:
+        actual = [json.loads(line.strip()) for line in f]
+      self.assertEqual([ex["prediction"] for ex in actual], ["pred0", "pred1"])
+      self.assertEqual([ex["target"] for ex in actual], ["target0", "target1"])
+
+  def test_write_async_error(self):
+    tmp_dir = self.create_tempdir().full_path
+    logger = loggers.JSONLogger(tmp_dir, write_async=True)
+    log_kwargs = dict(
+        task_name="test",
+        step=42,
+        metrics={"accuracy": metrics_lib.Scalar(100)},
+        dataset=None,
+        inferences=None,
+        targets=None,
+    )
+
+    with mock.patch.object(
+        tf.io.gfile,
+        "GFile",
+        side_effect=tf.errors.PermissionDeniedError(None, None, "denied"),
+    ):
+      logger(**log_kwargs)
+      # The error of the background write is raised by the next call.
+      with self.assertRaises(tf.errors.PermissionDeniedError):
+        logger(**log_kwargs)
+
+      logger(**log_kwargs)
+      # The error of the last background write is raised by `close`.
+      with self.assertRaises(tf.errors.PermissionDeniedError):
+        logger.close()
+
+  def test_write_async_delete_pending(self):
+    inferences = {"prediction": ["pred0", "pred1"], "score": [0.2, 0.3]}
+    targets = ["target0", "target1"]
+    tmp_dir = self.create_tempdir().full_path
+    task_dataset = self._get_task_dataset_for_write_to_file_tests()
+
+    logger = loggers.JSONLogger(tmp_dir, write_async=True)
+    executor = logger._executor  # pylint: disable=protected-access
+
+    gfile_cls = tf.io.gfile.GFile
+    release_write = threading.Event()
+
+    def blocking_gfile(*args, **kwargs):
+      release_write.wait()
+      return gfile_cls(*args, **kwargs)
+
+    with mock.patch.object(tf.io.gfile, "GFile", side_effect=blocking_gfile):
+      logger(
+          task_name="test",
+          step=42,
+          metrics={"accuracy": metrics_lib.Scalar(100)},
+          dataset=task_dataset,
+          inferences=inferences,
+          targets=targets,
+      )
+      # The pending write does not keep the logger alive, so it is deleted
+      # from this thread without waiting for the write.
+      logger_ref = weakref.ref(logger)
+      del logger
+      gc.collect()
+      self.assertIsNone(logger_ref())
+
+      release_write.set()
+      executor.shutdown(wait=True)
+
+    # Validate the metrics file.
+    with open(os.path.join(tmp_dir, "test-metrics.jsonl")) as f:
+      self.assertDictEqual(json.load(f), {"step": 42, "accuracy": 100.0})
+
+    # Read the written jsonl file.
+    with open(os.path.join(tmp_dir, "test-000042.jsonl")) as f:
+      actual = [json.loads(line.strip()) for line in f]
+    self.assertEqual([ex["prediction"] for ex in actual], ["pred0", "pred1"])
+
 
 class TensorAndNumpyEncoderLoggerTest(tf.test.TestCase):
 
@@ -763,6 +955,21 @@ class TensorAndNumpyEncoderLoggerTest(tf.test.TestCase):
         ),
     )
 
+  def test_long_bfloat16_numpy(self):
+    obj = np.arange(100).astype(tf.bfloat16.as_numpy_dtype)
+    self.assertEqual(
+        self.logger.encode(obj),
+        (
+            '"ndarray(shape=(100,), dtype=bfloat16); summary: 0.0, 1.0, 2.0, '
+            '3.0, 4.0 ... 95.0, 96.0, 97.0, 98.0, 99.0"'
+        ),
+    )
+
+  def test_bytes(self):
+    self.assertEqual(self.logger.encode(b"foo"), '"foo"')
+    self.assertEqual(self.logger.encode("é".encode("utf-8")), '"\\u00e9"')
+    self.assertEqual(self.logger.encode(b"\x99"), '"mQ=="')
+
   def test_dataclass(self):
     @dataclasses.dataclass
     class Foo:
@@ -17,6 +17,8 @@
 import dataclasses
 import enum
 import inspect
+import sys
+import weakref
 from typing import Any, Callable, Dict, Mapping, Optional, Sequence, Tuple, Union
 
 import clu.metrics
@@ -25,8 +27,12 @@ import numpy as np
 from seqio import utils
 import tensorflow.compat.v2 as tf
 
+# MetricValues are created for every metric at every evaluation, so they use
+# `__slots__` when supported (Python 3.10+) to avoid a `__dict__` per instance.
+_DATACLASS_KWARGS = {"slots": True} if sys.version_info >= (3, 10) else {}
 
-@dataclasses.dataclass
+
+@dataclasses.dataclass(**_DATACLASS_KWARGS)
 class MetricValue:
   """A base method for the dataclasses that represent tensorboard values.
 
@@ -35,21 +41,21 @@ class MetricValue:
   """
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(**_DATACLASS_KWARGS)
 class Scalar(MetricValue):
   """The default tensorflow value, used for creating time series graphs."""
 
   value: Union[int, float]
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(**_DATACLASS_KWARGS)
 class Text(MetricValue):
   """Text to output to tensorboard, markdown is rendered by tensorboard."""
 
   textdata: Union[str, bytes]
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(**_DATACLASS_KWARGS)
 class Image(MetricValue):
   """An image to output to tensorboard.
 
@@ -62,7 +68,7 @@ class Image(MetricValue):
   max_outputs: int = 3
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(**_DATACLASS_KWARGS)
 class Audio(MetricValue):
   """An audio example to output to tensorboard.
 
@@ -76,7 +82,7 @@ class Audio(MetricValue):
   max_outputs: int = 3
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(**_DATACLASS_KWARGS)
 class Histogram(MetricValue):
   """A histogram to output to tensorboard."""
 
@@ -84,7 +90,7 @@ class Histogram(MetricValue):
   bins: Optional[int] = None
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(**_DATACLASS_KWARGS)
 class Generic(MetricValue):
   """A raw tensor to output to tensorboard."""
 
@@ -113,6 +119,67 @@ class ModelOutputType(enum.Enum):
 MetricFnCallable = Callable[..., Mapping[str, Union[MetricValue, float]]]
 
 
+# Model output types inferred from metric_fn signatures. Keys are held weakly so
+# that metric_fns (and anything they capture) are not kept alive by the cache.
+_MODEL_OUTPUT_TYPE_CACHE = weakref.WeakKeyDictionary()
+
+
+def get_model_output_type(metric_fn: MetricFnCallable) -> ModelOutputType:
+  """Returns the model output type expected by a legacy metric_fn.
+
+  Args:
+    metric_fn: a metric function whose positional arguments are either
+      `(targets, scores)`, `(targets, predictions)` or `(targets, predictions,
+      aux_values)`.
+
+  Returns:
+    The ModelOutputType matching the metric_fn positional arguments.
+  Raises:
+    ValueError: if the positional arguments do not match any model output type.
+  """
+  try:
+    return _MODEL_OUTPUT_TYPE_CACHE[metric_fn]
+  except (KeyError, TypeError):
+    pass
+  model_output_type = _infer_model_output_type(metric_fn)
+  try:
+    _MODEL_OUTPUT_TYPE_CACHE[metric_fn] = model_output_type
+  except TypeError:
+    # metric_fn is not hashable or does not support weak references.
+    pass
+  return model_output_type
+
+
+def _infer_model_output_type(metric_fn: MetricFnCallable) -> ModelOutputType:
+  """Infers the model output type from the metric_fn positional arguments."""
+  pos_args = tuple(
+      key
+      for key, param in inspect.signature(metric_fn).parameters.items()
+      if param.default == inspect.Parameter.empty
+      and param.kind == inspect.Parameter.POSITIONAL_OR_KEYWORD
+  )
+  if pos_args == ("targets", "scores"):
+    return ModelOutputType.SCORE
+  elif pos_args == ("targets", "predictions"):
+    return ModelOutputType.PREDICTION
+  elif pos_args == ("targets", "predictions", "aux_values"):
+    return ModelOutputType.PREDICTION_WITH_AUX
+  else:
+    raise ValueError(
+        "Metric functions must have positional arguments matching either "
+        "('targets', 'scores'), ('targets', 'predictions') or "
+        "('targets', 'predictions', 'aux_values'). "
+        f"Got: {pos_args}"
+    )
+
+
+def _as_token_ids(tokens: Any) -> Any:
+  """Converts a 1-D array of token ids to a list of Python ints in one call."""
+  if isinstance(tokens, np.ndarray) and tokens.ndim == 1:
+    return tokens.tolist()
+  return tokens
+
+
 @flax.struct.dataclass
 class Metric(clu.metrics.Metric):
   """Base Metric class for seqio evaluation."""
@@ -155,25 +222,7 @@ class LegacyMetric(Metric):
 
   @classmethod
   def empty(cls, metric_fn, postprocess_fn) -> "LegacyMetric":
-    pos_args = tuple(
-        key
-        for key, param in inspect.signature(metric_fn).parameters.items()
-        if param.default == inspect.Parameter.empty
-        and param.kind == inspect.Parameter.POSITIONAL_OR_KEYWORD
-    )
-    if pos_args == ("targets", "scores"):
-      model_output_type = ModelOutputType.SCORE
-    elif pos_args == ("targets", "predictions"):
-      model_output_type = ModelOutputType.PREDICTION
-    elif pos_args == ("targets", "predictions", "aux_values"):
-      model_output_type = ModelOutputType.PREDICTION_WITH_AUX
-    else:
-      raise ValueError(
-          "Metric functions must have positional arguments matching either "
-          "('targets', 'scores'), ('targets', 'predictions') or "
-          "('targets', 'predictions', 'aux_values'). "
-          f"Got: {pos_args}"
-      )
+    model_output_type = get_model_output_type(metric_fn)
 
     return cls(
         _metric_fn=metric_fn,
@@ -198,6 +247,13 @@ class LegacyMetric(Metric):
       features: Mapping[str, utils.Feature],
       target_field_name: str = "targets",
   ) -> "LegacyMetric":
+    # Per-example postprocessing calls are skipped when they are the identity,
+    # unless a subclass overrides `postprocess_fn`.
+    skip_postprocess = (
+        not self._postprocess_fn
+        and type(self).postprocess_fn is LegacyMetric.postprocess_fn
+    )
+
     if not self.metric_fn_kwargs.get("targets"):
       # Postprocesses the targets here.
       postprocessed_targets = []
@@ -207,14 +263,14 @@ class LegacyMetric(Metric):
           target = ex[pretokenized_target_field_name]
         else:
           target = features[target_field_name].vocabulary.decode(
-              list(ex[target_field_name])
+              _as_token_ids(ex[target_field_name])
           )
         if isinstance(target, bytes):
           target = target.decode("utf-8")
 
-        postprocessed_targets.append(
-            self.postprocess_fn(target, example=ex, is_target=True)
-        )
+        if not skip_postprocess:
+          target = self.postprocess_fn(target, example=ex, is_target=True)
+        postprocessed_targets.append(target)
       self.metric_fn_kwargs["targets"] = postprocessed_targets
       self.targets_and_inferences["targets"] = postprocessed_targets
 
@@ -226,16 +282,25 @@ class LegacyMetric(Metric):
       if self.model_output_type == ModelOutputType.PREDICTION_WITH_AUX:
         self.metric_fn_kwargs["aux_values"] = model_output[1]
         self.targets_and_inferences["aux_value"] = model_output[1]
-        predictions = [vocab.decode(tokens) for tokens in model_output[0]]
+        predictions = [
+            vocab.decode(_as_token_ids(tokens)) for tokens in model_output[0]
+        ]
       elif self.model_output_type == ModelOutputType.PREDICTION:
-        predictions = [vocab.decode(tokens) for tokens in model_output]
+        predictions = [
+            vocab.decode(_as_token_ids(tokens)) for tokens in model_output
+        ]
       self.targets_and_inferences["output"] = predictions
 
       # Postprocesses the predictions here.
-      postprocessed_predictions = [
-          self.postprocess_fn(p, example=ex, is_target=False)
-          for ex, p in zip(inputs, predictions)
-      ]
+      if skip_postprocess:
+        # Copied so that a metric_fn modifying its predictions does not alter
+        # the logged outputs.
+        postprocessed_predictions = list(predictions)
+      else:
+        postprocessed_predictions = [
+            self.postprocess_fn(p, example=ex, is_target=False)
+            for ex, p in zip(inputs, predictions)
+        ]
 
       self.metric_fn_kwargs["predictions"] = postprocessed_predictions
       self.targets_and_inferences["prediction"] = postprocessed_predictions